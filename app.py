@@ -1,20 +1,30 @@
 from __future__ import annotations
 
 import json
+import math
 import os
 import secrets
 from datetime import datetime, timezone
-from dataclasses import dataclass
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterable, Iterator, Optional
 from urllib.error import HTTPError, URLError
 from urllib.parse import urlencode
 from urllib.request import Request, urlopen
+from zoneinfo import ZoneInfo
 
-from flask import Flask, request, jsonify, render_template, redirect, url_for, flash
+from flask import Flask, Response, request, jsonify, render_template, redirect, url_for, flash
 from dotenv import load_dotenv
 
 import resend
 import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from batch_pricing import parse_batch, price_grid, rank_by_usage
+from bill_risk import POOL_THRESHOLD, parse_plan, simulate_bill_risk
+from click_rollups import ClickRollupStore
+from fixed_rate_plan import PlanInput, PlanInputWithCredit
+from rate_limit import MemoryBucketStore, RateLimit, SQLiteBucketStore
+from whatif import SQLiteWhatIfSessionStore, WhatIfPlan, WhatIfSessionStore
 
 load_dotenv()
 
@@ -23,87 +33,106 @@ app = Flask(__name__)
 resend.api_key = os.environ.get("RESEND_API_KEY", "")
 RESEND_FROM = os.environ.get("RESEND_FROM", "WattWise <guides@wattwisetx.com>")
 
-@dataclass
-class PlanInput:
-    base_charge: float
-    energy_rate_cents: float
-    tdu_rate_cents: float
-    base_delivery_charge: float
-    usage_kwh: float
+POWER_TO_CHOOSE_URL = "https://www.powertochoose.org/en-us"
 
-    @classmethod
-    def from_json(cls, data: Dict[str, Any]) -> "PlanInput":
-        try:
-            base_charge = float(data["base_charge"])
-            energy_rate_cents = float(data["energy_rate_cents"])
-            tdu_rate_cents = float(data["tdu_rate_cents"])
-            base_delivery_charge = float(data["base_delivery_charge"])
-            usage_kwh = float(data["usage_kwh"])
-        except (KeyError, TypeError, ValueError) as exc:
-            raise ValueError("Invalid or missing input data") from exc
+RATE_LIMIT_ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "1") != "0"
 
-        if usage_kwh <= 0:
-            raise ValueError("Usage must be greater than zero")
 
-        return cls(
-            base_charge=base_charge,
-            energy_rate_cents=energy_rate_cents,
-            tdu_rate_cents=tdu_rate_cents,
-            base_delivery_charge=base_delivery_charge,
-            usage_kwh=usage_kwh,
-        )
+def build_rate_limits() -> Dict[str, Dict[str, RateLimit]]:
+    # Per-endpoint token buckets keyed by client IP and, where the form carries one, email.
+    # Override any entry with RATE_LIMIT_<ENDPOINT>_<SCOPE>="<requests>/<seconds>",
+    # e.g. RATE_LIMIT_SUBSCRIBE_EMAIL="3/3600".
+    limits: Dict[str, Dict[str, RateLimit]] = {
+        "subscribe": {
+            "ip": RateLimit(capacity=10, period_seconds=60),
+            "email": RateLimit(capacity=3, period_seconds=3600),
+        },
+        "calculate": {
+            "ip": RateLimit(capacity=120, period_seconds=60),
+        },
+        "simulate": {
+            "ip": RateLimit(capacity=10, period_seconds=60),
+        },
+        "calculate_stream": {
+            "ip": RateLimit(capacity=10, period_seconds=60),
+        },
+        "whatif_start": {
+            "ip": RateLimit(capacity=60, period_seconds=60),
+        },
+        "whatif_update": {
+            # Sliders send a delta per keystroke or drag step.
+            "ip": RateLimit(capacity=600, period_seconds=60),
+        },
+        "compare_redirect": {
+            "ip": RateLimit(capacity=30, period_seconds=60),
+        },
+    }
+    for endpoint, scopes in limits.items():
+        for scope in scopes:
+            override = os.environ.get(f"RATE_LIMIT_{endpoint.upper()}_{scope.upper()}")
+            if override:
+                scopes[scope] = RateLimit.parse(override)
+    return limits
 
-    def energy_charge_dollars(self) -> float:
-        return ((self.energy_rate_cents + self.tdu_rate_cents) / 100) * self.usage_kwh
 
-    def fixed_charge_dollars(self) -> float:
-        return self.base_charge + self.base_delivery_charge
+RATE_LIMITS = build_rate_limits()
 
-    def calculate_bill_amount(self) -> float:
-        return self.energy_charge_dollars() + self.fixed_charge_dollars()
 
-    def calculate_true_rate_cents(self) -> float:
-        return (self.calculate_bill_amount() / self.usage_kwh) * 100
+def build_rate_limit_store() -> Any:
+    backend = os.environ.get("RATE_LIMIT_BACKEND", "memory").lower()
+    if backend == "sqlite":
+        # Share buckets across gunicorn workers on the same host.
+        path = os.environ.get("RATE_LIMIT_SQLITE_PATH", "/tmp/wattwise-rate-limits.sqlite3")
+        return SQLiteBucketStore(path)
+    return MemoryBucketStore()
 
 
-@dataclass
-class PlanInputWithCredit(PlanInput):
-    usage_credit: float
-    credit_threshold_kwh: float
+rate_limit_store = build_rate_limit_store()
 
-    @classmethod
-    def from_json(cls, data: Dict[str, Any]) -> "PlanInputWithCredit":
-        base_plan = PlanInput.from_json(data)
+# Local hourly/daily rollups of compare clicks for dashboards; off unless a path is set.
+# Days follow Texas (Central) time unless CLICK_ROLLUPS_TZ names another zone.
+CLICK_ROLLUPS_PATH = os.environ.get("CLICK_ROLLUPS_PATH", "")
+CLICK_ROLLUPS_TZ = ZoneInfo(os.environ.get("CLICK_ROLLUPS_TZ", "America/Chicago"))
+click_rollups = (
+    ClickRollupStore(CLICK_ROLLUPS_PATH, tz=CLICK_ROLLUPS_TZ) if CLICK_ROLLUPS_PATH else None
+)
 
-        try:
-            usage_credit = float(data["usage_credit"])
-            credit_threshold_kwh = float(data["credit_threshold_kwh"])
-        except (KeyError, TypeError, ValueError) as exc:
-            raise ValueError("Invalid or missing credit data") from exc
-
-        if usage_credit < 0:
-            raise ValueError("Usage credit cannot be negative")
-
-        if credit_threshold_kwh < 0:
-            raise ValueError("Usage threshold cannot be negative")
-
-        return cls(
-            base_charge=base_plan.base_charge,
-            energy_rate_cents=base_plan.energy_rate_cents,
-            tdu_rate_cents=base_plan.tdu_rate_cents,
-            base_delivery_charge=base_plan.base_delivery_charge,
-            usage_kwh=base_plan.usage_kwh,
-            usage_credit=usage_credit,
-            credit_threshold_kwh=credit_threshold_kwh,
-        )
-
-    def calculate_bill_amount(self) -> float:
-        base_amount = super().calculate_bill_amount()
-        if self.usage_kwh >= self.credit_threshold_kwh:
-            adjusted_amount = base_amount - self.usage_credit
-        else:
-            adjusted_amount = base_amount
-        return max(adjusted_amount, 0.0)
+# In-memory what-if sessions only work with one worker (or sticky routing); set
+# WHATIF_SESSIONS_PATH to share them across gunicorn workers through SQLite.
+WHATIF_SESSIONS_PATH = os.environ.get("WHATIF_SESSIONS_PATH", "")
+whatif_sessions: Any = (
+    SQLiteWhatIfSessionStore(WHATIF_SESSIONS_PATH) if WHATIF_SESSIONS_PATH else WhatIfSessionStore()
+)
+
+_simulation_executor: Optional[ProcessPoolExecutor] = None
+_simulation_executor_lock = threading.Lock()
+
+
+def simulation_executor() -> ProcessPoolExecutor:
+    # Created on first use so each gunicorn worker owns its pool after forking.
+    global _simulation_executor
+    with _simulation_executor_lock:
+        if _simulation_executor is None:
+            max_workers = int(os.environ.get("SIMULATION_WORKERS", "0")) or None
+            _simulation_executor = ProcessPoolExecutor(max_workers=max_workers)
+        return _simulation_executor
+
+
+def discard_simulation_executor(executor: ProcessPoolExecutor) -> None:
+    # A pool whose worker died stays broken; drop it so the next run gets a fresh one.
+    global _simulation_executor
+    with _simulation_executor_lock:
+        if _simulation_executor is executor:
+            _simulation_executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def running_under_gevent() -> bool:
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched("socket")
 
 
 def supabase_context() -> Dict[str, str]:
@@ -289,6 +318,58 @@ def send_welcome_email(email: str, unsubscribe_token: str, zip_code: Optional[st
         return False
 
 
+def client_ip() -> str:
+    # Render's proxy appends the connecting address, so the last hop is the real client.
+    access_route = request.access_route
+    if access_route:
+        return access_route[-1]
+    return request.remote_addr or ""
+
+
+@app.before_request
+def enforce_rate_limits() -> Any:
+    if not RATE_LIMIT_ENABLED:
+        return None
+
+    limits = RATE_LIMITS.get(request.endpoint or "")
+    if not limits:
+        return None
+
+    identities = {"ip": client_ip()}
+    if "email" in limits:
+        identities["email"] = (request.form.get("email") or "").strip().lower()
+
+    for scope, limit in limits.items():
+        identity = identities.get(scope)
+        if not identity:
+            continue
+        try:
+            retry_after = rate_limit_store.hit(f"{request.endpoint}:{scope}:{identity}", limit)
+        except Exception as error:  # noqa: BLE001
+            app.logger.error("Rate limit check failed; allowing request: %s", error)
+            return None
+        if retry_after > 0:
+            app.logger.info("Rate limited %s by %s", request.endpoint, scope)
+            return rate_limited_response(retry_after)
+
+    return None
+
+
+def rate_limited_response(retry_after: float) -> Any:
+    if request.endpoint == "compare_redirect":
+        # Visitors still reach Power to Choose; skipping the view drops the Supabase/rollup logging.
+        return redirect(POWER_TO_CHOOSE_URL, code=302)
+
+    wants_json = "application/json" in request.headers.get("Accept", "")
+    if request.endpoint == "subscribe" and not wants_json:
+        return redirect(url_for("index"))
+
+    response = jsonify({"error": "Too many requests. Please try again shortly."})
+    response.status_code = 429
+    response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
 @app.route("/")
 def index() -> str:
     return render_template("landing.html")
@@ -342,6 +423,11 @@ def compare_redirect() -> Any:
         app.logger.warning("SUPABASE_SERVICE_KEY is not set; compare clicks may fail due to RLS.")
 
     def log_compare_click() -> None:
+        if click_rollups is not None:
+            try:
+                click_rollups.record(payload)
+            except Exception as error:  # noqa: BLE001
+                app.logger.error("Failed to roll up compare click: %s", error)
         try:
             supabase_request("POST", "clicks", payload=[payload])
         except Exception as error:  # noqa: BLE001
@@ -349,7 +435,7 @@ def compare_redirect() -> Any:
 
     threading.Thread(target=log_compare_click, daemon=True).start()
 
-    return redirect("https://www.powertochoose.org/en-us", code=302)
+    return redirect(POWER_TO_CHOOSE_URL, code=302)
 
 
 @app.route("/subscribe", methods=["POST"])
@@ -453,6 +539,18 @@ def unsubscribe() -> Any:
     return render_template("unsubscribe.html", status="success")
 
 
+def ndjson_response(rows: Iterable[Dict[str, Any]]) -> Response:
+    # Rows are serialized as they are produced; with no Content-Length the body is sent chunked.
+    def generate() -> Iterator[str]:
+        for row in rows:
+            yield json.dumps(row, separators=(",", ":")) + "\n"
+
+    response = Response(generate(), mimetype="application/x-ndjson")
+    response.headers["Cache-Control"] = "no-store"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
 @app.route("/api/calculate", methods=["POST"])
 def calculate() -> Any:
     data = request.json or {}
@@ -483,6 +581,93 @@ def calculate() -> Any:
     )
 
 
+@app.route("/api/whatif", methods=["POST"])
+def whatif_start() -> Any:
+    data = request.json or {}
+
+    try:
+        plan = WhatIfPlan.from_json(data)
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+
+    session_id = whatif_sessions.create(plan)
+    return jsonify({"session_id": session_id, **plan.result()})
+
+
+@app.route("/api/whatif/<session_id>", methods=["PATCH"])
+def whatif_update(session_id: str) -> Any:
+    plan = whatif_sessions.get(session_id)
+    if plan is None:
+        return jsonify({"error": "What-if session expired. Send the full plan again.", "expired": True}), 404
+
+    try:
+        plan.apply(request.json or {})
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+
+    whatif_sessions.save(session_id, plan)
+    return jsonify({"session_id": session_id, **plan.result()})
+
+
+@app.route("/api/calculate/stream", methods=["POST"])
+def calculate_stream() -> Any:
+    data = request.json or {}
+
+    try:
+        plans, usages = parse_batch(data)
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+
+    mode = data.get("mode", "grid")
+    if mode not in {"grid", "rank"}:
+        return jsonify({"error": "Unsupported mode"}), 400
+
+    if mode == "rank":
+        return ndjson_response(rank_by_usage(plans, usages))
+    return ndjson_response(price_grid(plans, usages))
+
+
+@app.route("/api/simulate", methods=["POST"])
+def simulate() -> Any:
+    data = request.json or {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "Invalid or missing input data"}), 400
+
+    plan_type = data.get("plan_type", "fixed_rate")
+
+    try:
+        plan_input = parse_plan(plan_type, data)
+        try:
+            scenarios = int(data.get("scenarios", 10_000))
+            usage_stddev_pct = float(data.get("usage_stddev_pct", 15))
+            seed = int(data.get("seed", 0))
+        except (TypeError, ValueError) as exc:
+            raise ValueError("Invalid simulation settings") from exc
+        # A gevent worker runs every request on one thread, so even a small inline run
+        # would stall its in-flight signups; waiting on the pool yields instead.
+        pool_threshold = 0 if running_under_gevent() else POOL_THRESHOLD
+        for attempt in range(2):
+            executor = simulation_executor()
+            try:
+                result = simulate_bill_risk(
+                    plan_input,
+                    scenarios=scenarios,
+                    usage_stddev_pct=usage_stddev_pct,
+                    seed=seed,
+                    executor=executor,
+                    pool_threshold=pool_threshold,
+                )
+                break
+            except BrokenProcessPool:
+                discard_simulation_executor(executor)
+                if attempt:
+                    raise
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+
+    return jsonify(result.to_json())
+
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
     app.run(host="0.0.0.0", port=port)
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import dataclasses
+import time
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+from bill_risk import bill_amount, check_plan_value, parse_plan
+
+MAX_PLANS = 5_000
+MAX_USAGES = 5_000
+# Tiered plans price and serialize at roughly 55k rows/s, so this keeps a job to a few
+# seconds, well inside gunicorn's 30 s worker timeout; a killed worker would truncate
+# the stream after the 200 status has already been sent.
+MAX_ROWS = 250_000
+# Under gevent workers ``time.sleep(0)`` hands control to other in-flight requests (and
+# gunicorn's heartbeat); under sync workers it is a near no-op.
+YIELD_EVERY = 500
+
+
+def parse_batch(data: Dict[str, Any]) -> Tuple[List[Tuple[Any, Any]], List[float]]:
+    """Validate a ``{"plans": [...], "usages": [...]}`` job before any output is sent.
+
+    Returns ``(plan_id, plan)`` pairs and the usages. Plans use the same fields as
+    ``/api/calculate`` (with their own ``plan_type``); ``usage_kwh`` may be omitted.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Invalid or missing input data")
+
+    plans_data = data.get("plans")
+    usages_data = data.get("usages")
+    if not isinstance(plans_data, list) or not plans_data:
+        raise ValueError("Plans must be a non-empty list")
+    if not isinstance(usages_data, list) or not usages_data:
+        raise ValueError("Usages must be a non-empty list")
+    if len(plans_data) > MAX_PLANS:
+        raise ValueError(f"At most {MAX_PLANS} plans per request")
+    if len(usages_data) > MAX_USAGES:
+        raise ValueError(f"At most {MAX_USAGES} usages per request")
+    if len(plans_data) * len(usages_data) > MAX_ROWS:
+        raise ValueError(f"At most {MAX_ROWS} plan and usage combinations per request")
+
+    try:
+        usages = [float(usage) for usage in usages_data]
+    except (TypeError, ValueError) as exc:
+        raise ValueError("Invalid or missing input data") from exc
+    if any(usage <= 0 for usage in usages):
+        raise ValueError("Usage must be greater than zero")
+    # NaN or Infinity would only surface mid-stream, after the 200 has been sent.
+    for usage in usages:
+        check_plan_value(usage)
+
+    plans = []
+    for index, plan_data in enumerate(plans_data):
+        if not isinstance(plan_data, dict):
+            raise ValueError("Invalid or missing input data")
+        plan_type = plan_data.get("plan_type", "fixed_rate")
+        try:
+            plan = parse_plan(plan_type, {**plan_data, "usage_kwh": usages[0]})
+        except ValueError as error:
+            raise ValueError(f"Plan {index}: {error}") from error
+        plans.append((plan_data.get("id", index), plan))
+
+    return plans, usages
+
+
+def _price(plan: Any, usage: float) -> Tuple[float, float]:
+    bill = bill_amount(dataclasses.replace(plan, usage_kwh=usage))
+    return round(bill, 2), round((bill / usage) * 100, 2)
+
+
+def price_grid(plans: Sequence[Tuple[Any, Any]], usages: Sequence[float]) -> Iterator[Dict[str, Any]]:
+    """Yield one row per plan and usage, in request order, as each is priced."""
+    priced = 0
+    for plan_id, plan in plans:
+        for usage in usages:
+            priced += 1
+            if priced % YIELD_EVERY == 0:
+                time.sleep(0)
+            bill, true_rate_cents = _price(plan, usage)
+            yield {
+                "plan_id": plan_id,
+                "usage_kwh": usage,
+                "bill_amount": bill,
+                "true_rate_cents": true_rate_cents,
+            }
+
+
+def rank_by_usage(plans: Sequence[Tuple[Any, Any]], usages: Sequence[float]) -> Iterator[Dict[str, Any]]:
+    """Yield one row per usage with every plan ordered from cheapest to most expensive."""
+    count = 0
+    for usage in usages:
+        priced = []
+        for plan_id, plan in plans:
+            count += 1
+            if count % YIELD_EVERY == 0:
+                time.sleep(0)
+            bill, true_rate_cents = _price(plan, usage)
+            priced.append({"plan_id": plan_id, "bill_amount": bill, "true_rate_cents": true_rate_cents})
+        priced.sort(key=lambda row: row["bill_amount"])
+        yield {"usage_kwh": usage, "ranking": priced}
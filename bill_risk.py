@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import dataclasses
+import math
+import random
+import statistics
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from fixed_rate_plan import PlanInput, PlanInputWithCredit
+from tiered_plan import TieredPlanInput, calculateTieredPlan
+
+# Scenarios are drawn in fixed-size chunks, each seeded from (seed, chunk index), so
+# a run gives the same distribution whether it runs inline or on any number of workers.
+CHUNK_SIZE = 5_000
+POOL_THRESHOLD = 20_000
+MAX_SCENARIOS = 200_000
+MAX_USAGE_STDDEV_PCT = 100.0
+# float() accepts "nan", "inf" and "1e308"; bills built from them serialize as
+# NaN/Infinity, which is not valid JSON.
+MAX_PLAN_VALUE = 1_000_000.0
+
+
+@dataclass
+class BillRiskResult:
+    scenarios: int
+    mean_bill: float
+    p10_bill: float
+    p50_bill: float
+    p90_bill: float
+    min_bill: float
+    max_bill: float
+    threshold_kwh: Optional[float]
+    probability_below_threshold: Optional[float]
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "scenarios": self.scenarios,
+            "mean_bill": round(self.mean_bill, 2),
+            "p10_bill": round(self.p10_bill, 2),
+            "p50_bill": round(self.p50_bill, 2),
+            "p90_bill": round(self.p90_bill, 2),
+            "min_bill": round(self.min_bill, 2),
+            "max_bill": round(self.max_bill, 2),
+            "threshold_kwh": self.threshold_kwh,
+            "probability_below_threshold": (
+                round(self.probability_below_threshold, 4)
+                if self.probability_below_threshold is not None
+                else None
+            ),
+        }
+
+
+def check_plan_value(value: float) -> float:
+    if not math.isfinite(value) or abs(value) > MAX_PLAN_VALUE:
+        raise ValueError(f"Values must be finite numbers no larger than {MAX_PLAN_VALUE:,.0f}")
+    return value
+
+
+def parse_plan(plan_type: str, data: Dict[str, Any]) -> Any:
+    if plan_type == "fixed_rate":
+        plan = PlanInput.from_json(data)
+    elif plan_type == "fixed_rate_credit":
+        plan = PlanInputWithCredit.from_json(data)
+    elif plan_type == "tiered":
+        plan = TieredPlanInput.from_json(data)
+    else:
+        raise ValueError("Unsupported plan type")
+
+    for field in dataclasses.fields(plan):
+        value = getattr(plan, field.name)
+        if value is not None:
+            check_plan_value(value)
+    return plan
+
+
+def bill_amount(plan: Any) -> float:
+    if isinstance(plan, TieredPlanInput):
+        return calculateTieredPlan(plan).totalCost
+    return plan.calculate_bill_amount()
+
+
+def threshold_kwh(plan: Any) -> Optional[float]:
+    """Usage below which the plan gets more expensive: a missed credit or the tier 1 flat fee."""
+    if isinstance(plan, PlanInputWithCredit):
+        return plan.credit_threshold_kwh
+    if isinstance(plan, TieredPlanInput) and plan.tier1_flat_fee is not None:
+        return plan.tier1_limit
+    return None
+
+
+def _simulate_chunk(
+    plan: Any,
+    seed: int,
+    chunk_index: int,
+    scenarios: int,
+    usage_stddev_pct: float,
+) -> Tuple[List[float], int]:
+    rng = random.Random(f"{seed}:{chunk_index}")
+    mean_usage = plan.usage_kwh
+    stddev = mean_usage * usage_stddev_pct / 100
+    threshold = threshold_kwh(plan)
+
+    bills = []
+    below_threshold = 0
+    for _ in range(scenarios):
+        usage = rng.gauss(mean_usage, stddev)
+        # Usage must stay positive for the calculators; clamp the far left tail.
+        if usage < 1:
+            usage = 1.0
+        if threshold is not None and usage < threshold:
+            below_threshold += 1
+        bills.append(bill_amount(dataclasses.replace(plan, usage_kwh=usage)))
+    return bills, below_threshold
+
+
+def simulate_bill_risk(
+    plan: Any,
+    scenarios: int = 10_000,
+    usage_stddev_pct: float = 15.0,
+    seed: int = 0,
+    executor: Optional[Executor] = None,
+    pool_threshold: int = POOL_THRESHOLD,
+) -> BillRiskResult:
+    """Price ``scenarios`` monthly usages drawn around ``plan.usage_kwh``.
+
+    Usage is normally distributed with a standard deviation of ``usage_stddev_pct``
+    percent of the estimate. Runs of ``pool_threshold`` scenarios or more are split
+    across ``executor``, or a temporary process pool when none is given.
+    """
+    if scenarios < 1 or scenarios > MAX_SCENARIOS:
+        raise ValueError(f"Scenarios must be between 1 and {MAX_SCENARIOS}")
+
+    if not math.isfinite(usage_stddev_pct):
+        raise ValueError("Usage spread must be a finite number")
+
+    if usage_stddev_pct < 0:
+        raise ValueError("Usage spread cannot be negative")
+
+    if usage_stddev_pct > MAX_USAGE_STDDEV_PCT:
+        raise ValueError(f"Usage spread cannot be more than {MAX_USAGE_STDDEV_PCT:g}%")
+
+    chunks = [
+        (index, min(CHUNK_SIZE, scenarios - start))
+        for index, start in enumerate(range(0, scenarios, CHUNK_SIZE))
+    ]
+
+    if scenarios < pool_threshold:
+        results = [
+            _simulate_chunk(plan, seed, index, size, usage_stddev_pct) for index, size in chunks
+        ]
+    elif executor is not None:
+        results = _map_chunks(executor, plan, seed, chunks, usage_stddev_pct)
+    else:
+        with ProcessPoolExecutor() as pool:
+            results = _map_chunks(pool, plan, seed, chunks, usage_stddev_pct)
+
+    bills: List[float] = []
+    below_threshold = 0
+    for chunk_bills, chunk_below in results:
+        bills.extend(chunk_bills)
+        below_threshold += chunk_below
+
+    threshold = threshold_kwh(plan)
+    if len(bills) > 1:
+        deciles = statistics.quantiles(bills, n=10, method="inclusive")
+        p10, p50, p90 = deciles[0], deciles[4], deciles[8]
+    else:
+        p10 = p50 = p90 = bills[0]
+
+    return BillRiskResult(
+        scenarios=scenarios,
+        mean_bill=statistics.fmean(bills),
+        p10_bill=p10,
+        p50_bill=p50,
+        p90_bill=p90,
+        min_bill=min(bills),
+        max_bill=max(bills),
+        threshold_kwh=threshold,
+        probability_below_threshold=below_threshold / scenarios if threshold is not None else None,
+    )
+
+
+def _map_chunks(
+    executor: Executor,
+    plan: Any,
+    seed: int,
+    chunks: List[Tuple[int, int]],
+    usage_stddev_pct: float,
+) -> List[Tuple[List[float], int]]:
+    futures = [
+        executor.submit(_simulate_chunk, plan, seed, index, size, usage_stddev_pct)
+        for index, size in chunks
+    ]
+    return [future.result() for future in futures]
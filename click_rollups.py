@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime, timezone, tzinfo
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+ROLLUP_DIMENSIONS = ("source", "tdu", "plan_type", "zip_code")
+GRANULARITY_SECONDS = {"hour": 3600, "day": 86400}
+
+# Dimension values come from query strings, so anything unrecognised is counted as
+# "other" to keep the number of rollup rows bounded.
+OTHER_VALUE = "other"
+MAX_SOURCE_LENGTH = 32
+PLAN_TYPES = frozenset({"fixed_rate", "fixed_rate_credit", "tiered", "tou"})
+# Both the calculator's TDU option values and the ``?tdu=`` slugs it accepts.
+TDU_ALIASES = {
+    "centerpoint": "centerpoint",
+    "oncor": "oncor",
+    "aep_central": "aep_central",
+    "aep texas central": "aep_central",
+    "aep_north": "aep_north",
+    "aep texas north": "aep_north",
+    "tnmp": "tnmp",
+    "custom": "custom",
+}
+_SOURCE_PATTERN = re.compile(rf"[a-z0-9_-]{{1,{MAX_SOURCE_LENGTH}}}")
+_ZIP_CODE_PATTERN = re.compile(r"(\d{5})(-\d{4})?")
+
+
+def normalize_dimensions(payload: Dict[str, Any]) -> Tuple[str, str, str, str]:
+    """Map a click payload to bounded ``(source, tdu, plan_type, zip_code)`` values."""
+    source, tdu, plan_type, zip_code = (
+        str(payload.get(name) or "").strip().lower() for name in ROLLUP_DIMENSIONS
+    )
+    if source and not _SOURCE_PATTERN.fullmatch(source):
+        source = OTHER_VALUE
+    if tdu:
+        tdu = TDU_ALIASES.get(tdu, OTHER_VALUE)
+    if plan_type and plan_type not in PLAN_TYPES:
+        plan_type = OTHER_VALUE
+    if zip_code:
+        match = _ZIP_CODE_PATTERN.fullmatch(zip_code)
+        zip_code = match.group(1) if match else OTHER_VALUE
+    return source, tdu, plan_type, zip_code
+
+
+def _bucket_start(at: datetime, granularity: str, tz: tzinfo) -> int:
+    if at.tzinfo is None:
+        at = at.replace(tzinfo=timezone.utc)
+    local = at.astimezone(tz).replace(minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        local = local.replace(hour=0)
+    return int(local.timestamp())
+
+
+class ClickRollupStore:
+    """Hourly and daily compare-click counts by source, tdu, plan_type and zip_code.
+
+    Each click bumps one counter row per granularity in ``click_rollups`` (every
+    dimension combined) and one per dimension in ``click_rollups_by_dimension``.
+    Queries over a single dimension read the narrow table, so "clicks per TDU per
+    day" touches a few rows per day even when zip_code has thousands of values.
+
+    Buckets start on the hour and at midnight in ``tz``; pass the site's local zone
+    so daily counts follow its calendar days. Keep one zone per database file.
+    """
+
+    def __init__(self, path: str, tz: tzinfo = timezone.utc, busy_timeout: float = 0.1) -> None:
+        self._path = path
+        self._tz = tz
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._connection_pid = 0
+        self._busy_timeout = busy_timeout
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per process, shared by the short-lived threads compare_redirect
+        # logs from; callers must hold ``self._lock``. Reopened after a fork.
+        pid = os.getpid()
+        if self._connection is None or self._connection_pid != pid:
+            # A short busy timeout: under gevent a wait here blocks the whole worker, and
+            # compare_redirect logs and drops a rollup write that fails.
+            connection = sqlite3.connect(self._path, timeout=self._busy_timeout, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                """
+                create table if not exists click_rollups (
+                  granularity text not null,
+                  bucket_start integer not null,
+                  source text not null,
+                  tdu text not null,
+                  plan_type text not null,
+                  zip_code text not null,
+                  clicks integer not null,
+                  primary key (granularity, bucket_start, source, tdu, plan_type, zip_code)
+                ) without rowid
+                """
+            )
+            connection.execute(
+                """
+                create table if not exists click_rollups_by_dimension (
+                  granularity text not null,
+                  dimension text not null,
+                  bucket_start integer not null,
+                  value text not null,
+                  clicks integer not null,
+                  primary key (granularity, dimension, bucket_start, value)
+                ) without rowid
+                """
+            )
+            connection.commit()
+            self._connection = connection
+            self._connection_pid = pid
+        return self._connection
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def record(self, payload: Dict[str, Any], at: Optional[datetime] = None) -> None:
+        """Count one click event (the payload built in ``compare_redirect``)."""
+        self.record_many([(payload, at or datetime.now(timezone.utc))])
+
+    def record_many(self, events: Iterable[Tuple[Dict[str, Any], datetime]]) -> None:
+        """Count a batch of ``(payload, created_at)`` pairs, e.g. a backfill from Supabase."""
+        counts: Dict[Tuple[Any, ...], int] = {}
+        dimension_counts: Dict[Tuple[Any, ...], int] = {}
+        for payload, at in events:
+            dimensions = normalize_dimensions(payload)
+            for granularity in GRANULARITY_SECONDS:
+                bucket_start = _bucket_start(at, granularity, self._tz)
+                key = (granularity, bucket_start) + dimensions
+                counts[key] = counts.get(key, 0) + 1
+                for name, value in zip(ROLLUP_DIMENSIONS, dimensions):
+                    dimension_key = (granularity, name, bucket_start, value)
+                    dimension_counts[dimension_key] = dimension_counts.get(dimension_key, 0) + 1
+
+        if not counts:
+            return
+
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.executemany(
+                    """
+                    INSERT INTO click_rollups
+                      (granularity, bucket_start, source, tdu, plan_type, zip_code, clicks)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (granularity, bucket_start, source, tdu, plan_type, zip_code)
+                    DO UPDATE SET clicks = clicks + excluded.clicks
+                    """,
+                    [key + (clicks,) for key, clicks in counts.items()],
+                )
+                connection.executemany(
+                    """
+                    INSERT INTO click_rollups_by_dimension
+                      (granularity, dimension, bucket_start, value, clicks)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (granularity, dimension, bucket_start, value)
+                    DO UPDATE SET clicks = clicks + excluded.clicks
+                    """,
+                    [key + (clicks,) for key, clicks in dimension_counts.items()],
+                )
+
+    def clicks(
+        self,
+        granularity: str = "day",
+        group_by: Sequence[str] = ("tdu",),
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        filters: Optional[Dict[str, str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Sum clicks per ``granularity`` bucket and ``group_by`` dimensions.
+
+        Both bounds are rounded down to a bucket start; ``start`` is inclusive and
+        ``end`` exclusive. Missing dimension values come back as ``None``, and
+        filters are normalized the same way recorded clicks are.
+        """
+        if granularity not in GRANULARITY_SECONDS:
+            raise ValueError("Unsupported granularity")
+
+        filters = filters or {}
+        for name in list(group_by) + list(filters):
+            if name not in ROLLUP_DIMENSIONS:
+                raise ValueError(f"Unsupported dimension: {name}")
+
+        if len(group_by) <= 1 and not filters:
+            # Every click is counted once per dimension, so any one of them gives totals.
+            dimension = group_by[0] if group_by else ROLLUP_DIMENSIONS[0]
+            table = "click_rollups_by_dimension"
+            conditions = ["granularity = ?", "dimension = ?"]
+            params: List[Any] = [granularity, dimension]
+            columns = ", ".join(["bucket_start", "value"] if group_by else ["bucket_start"])
+        else:
+            table = "click_rollups"
+            conditions = ["granularity = ?"]
+            params = [granularity]
+            normalized = dict(zip(ROLLUP_DIMENSIONS, normalize_dimensions(filters)))
+            for name in filters:
+                conditions.append(f"{name} = ?")
+                params.append(normalized[name])
+            columns = ", ".join(["bucket_start", *group_by])
+
+        if start is not None:
+            conditions.append("bucket_start >= ?")
+            params.append(_bucket_start(start, granularity, self._tz))
+        if end is not None:
+            conditions.append("bucket_start < ?")
+            params.append(_bucket_start(end, granularity, self._tz))
+
+        query = (
+            f"SELECT {columns}, SUM(clicks) FROM {table} "
+            f"WHERE {' AND '.join(conditions)} "
+            f"GROUP BY {columns} ORDER BY {columns}"
+        )
+
+        with self._lock:
+            rows = self._connect().execute(query, params).fetchall()
+
+        results = []
+        for row in rows:
+            result: Dict[str, Any] = {
+                "bucket_start": datetime.fromtimestamp(row[0], tz=self._tz),
+            }
+            for index, name in enumerate(group_by, start=1):
+                result[name] = row[index] or None
+            result["clicks"] = row[-1]
+            results.append(result)
+        return results
@@ -0,0 +1,7 @@
+import os
+
+# Gunicorn loads ./gunicorn.conf.py automatically, so the Procfile command stays `gunicorn app:app`.
+# Set GUNICORN_WORKER_CLASS=gevent to serve many requests per worker while they wait on
+# Supabase and Resend; gevent patches sockets, so urlopen and requests yield instead of blocking.
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "sync")
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", "1000"))
@@ -0,0 +1,69 @@
+"""Fire concurrent /subscribe requests at a running app and report latency.
+
+Run against the app wired to scripts/stub_upstream.py (see that file), e.g.:
+
+    python scripts/load_subscribe.py --url http://127.0.0.1:8000 --requests 200 --concurrency 200
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import secrets
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+
+def subscribe_once(url: str, timeout: float) -> Tuple[bool, float]:
+    body = urlencode({"email": f"load-{secrets.token_hex(6)}@example.com", "zip": "77002"}).encode("utf-8")
+    request_obj = Request(
+        f"{url.rstrip('/')}/subscribe",
+        data=body,
+        headers={"Accept": "application/json"},
+        method="POST",
+    )
+    started = time.perf_counter()
+    try:
+        with urlopen(request_obj, timeout=timeout) as response:
+            ok = bool(json.loads(response.read()).get("success"))
+    except (HTTPError, URLError, OSError):
+        ok = False
+    return ok, time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda _: subscribe_once(args.url, args.timeout), range(args.requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for _, latency in results)
+    succeeded = sum(1 for ok, _ in results if ok)
+    print(
+        json.dumps(
+            {
+                "requests": args.requests,
+                "succeeded": succeeded,
+                "elapsed_seconds": round(elapsed, 2),
+                "requests_per_second": round(args.requests / elapsed, 1),
+                "p50_seconds": round(statistics.median(latencies), 3),
+                "p95_seconds": round(latencies[int(len(latencies) * 0.95) - 1], 3),
+            }
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
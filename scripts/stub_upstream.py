@@ -0,0 +1,132 @@
+"""Local stand-in for Supabase REST and Resend that answers after a fixed delay.
+
+Point the app at it to see how many /subscribe requests a worker keeps in flight:
+
+    python scripts/stub_upstream.py --port 9000 --delay 0.5
+    SUPABASE_URL=http://127.0.0.1:9000 SUPABASE_KEY=stub RESEND_API_KEY=stub \\
+    RESEND_API_URL=http://127.0.0.1:9000 RATE_LIMIT_ENABLED=0 \\
+    GUNICORN_WORKER_CLASS=gevent gunicorn -w 2 app:app
+
+GET /stats reports how many upstream calls were served and the peak number in flight.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict
+
+
+class UpstreamStats:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.served = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def enter(self) -> None:
+        with self._lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def exit(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self.served += 1
+
+    def to_json(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "served": self.served,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+            }
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 resets connections when hundreds of calls arrive at once.
+    request_queue_size = 1024
+
+
+def make_handler(delay: float, stats: UpstreamStats) -> type:
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+        def _read_json(self) -> Any:
+            length = int(self.headers.get("Content-Length") or 0)
+            if not length:
+                return None
+            return json.loads(self.rfile.read(length))
+
+        def _send_json(self, status: int, body: Any) -> None:
+            data = json.dumps(body).encode("utf-8") if body is not None else b""
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _handle(self) -> None:
+            if self.command == "GET" and self.path == "/stats":
+                self._send_json(200, stats.to_json())
+                return
+
+            payload = self._read_json()
+            stats.enter()
+            try:
+                time.sleep(delay)
+                self._respond(payload)
+            finally:
+                stats.exit()
+
+        def _respond(self, payload: Any) -> None:
+            path = self.path.split("?", 1)[0]
+            if path == "/emails":
+                self._send_json(200, {"id": secrets.token_hex(8)})
+            elif path == "/rest/v1/leads" and self.command == "GET":
+                # Every email is new, so /subscribe takes the create path.
+                self._send_json(200, [])
+            elif path == "/rest/v1/leads":
+                rows = payload if isinstance(payload, list) else [payload]
+                self._send_json(201, [{"id": secrets.token_hex(4), **row} for row in rows])
+            elif path.startswith("/rest/v1/"):
+                self._send_json(201, None)
+            else:
+                self._send_json(404, {"error": "Not found"})
+
+        do_GET = _handle
+        do_POST = _handle
+        do_PATCH = _handle
+
+    return StubHandler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--delay", type=float, default=0.5, help="seconds to wait before each response")
+    args = parser.parse_args()
+
+    stats = UpstreamStats()
+    server = StubServer((args.host, args.port), make_handler(args.delay, stats))
+    print(f"Stub Supabase/Resend on http://{args.host}:{args.port} with {args.delay}s delay")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(stats.to_json()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+import json
+import os
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
+
+import app as app_module
+from rate_limit import MemoryBucketStore, RateLimit
+from whatif import SQLiteWhatIfSessionStore, WhatIfSessionStore
+
+FIXED_PLAN = {
+    "id": "fixed",
+    "plan_type": "fixed_rate",
+    "base_charge": 10,
+    "base_delivery_charge": 0,
+    "energy_rate_cents": 10,
+    "tdu_rate_cents": 5,
+}
+
+
+class AppTestCase(unittest.TestCase):
+    def setUp(self):
+        app_module.app.config["TESTING"] = True
+        # Fresh buckets so one test's requests don't throttle the next.
+        self.patch_module("rate_limit_store", MemoryBucketStore())
+        self.client = app_module.app.test_client()
+
+    def patch_module(self, name, value):
+        patcher = mock.patch.object(app_module, name, value)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class RateLimitTests(AppTestCase):
+    def throttle(self, endpoint):
+        return mock.patch.dict(app_module.RATE_LIMITS, {endpoint: {"ip": RateLimit(capacity=1, period_seconds=60)}})
+
+    def test_throttled_api_request_gets_429_with_retry_after(self):
+        with self.throttle("calculate"):
+            body = {**FIXED_PLAN, "usage_kwh": 1000}
+            self.assertEqual(self.client.post("/api/calculate", json=body).status_code, 200)
+            response = self.client.post("/api/calculate", json=body)
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers["Retry-After"], "60")
+        self.assertIn("error", response.get_json())
+
+    def test_throttled_compare_click_still_redirects_without_logging(self):
+        with self.throttle("compare_redirect"), mock.patch.object(app_module, "threading") as threading:
+            first = self.client.get("/go/compare?tdu=oncor")
+            second = self.client.get("/go/compare?tdu=oncor")
+
+        self.assertEqual(first.status_code, 302)
+        self.assertEqual(second.status_code, 302)
+        self.assertEqual(second.headers["Location"], app_module.POWER_TO_CHOOSE_URL)
+        self.assertEqual(threading.Thread.call_count, 1)
+
+    def test_throttled_subscribe_follows_wants_json(self):
+        with self.throttle("subscribe"), mock.patch.object(app_module, "get_subscriber_by_email", return_value=None), \
+                mock.patch.object(app_module, "create_subscriber", return_value=None):
+            self.client.post("/subscribe", data={"email": "a@example.com"})
+            form_post = self.client.post("/subscribe", data={"email": "a@example.com"})
+            json_post = self.client.post(
+                "/subscribe", data={"email": "a@example.com"}, headers={"Accept": "application/json"}
+            )
+
+        self.assertEqual(form_post.status_code, 302)
+        self.assertEqual(form_post.headers["Location"], "/")
+        self.assertEqual(json_post.status_code, 429)
+        self.assertEqual(json_post.headers["Retry-After"], "60")
+
+
+class SimulateEndpointTests(AppTestCase):
+    def test_non_finite_spread_is_rejected(self):
+        for usage_stddev_pct in ("nan", "inf", "-inf"):
+            response = self.client.post(
+                "/api/simulate",
+                json={**FIXED_PLAN, "usage_kwh": 1000, "scenarios": 10, "usage_stddev_pct": usage_stddev_pct},
+            )
+
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("error", response.get_json())
+
+    def test_non_finite_plan_values_are_rejected(self):
+        for field, value in (("usage_kwh", "inf"), ("usage_kwh", "nan"), ("energy_rate_cents", "nan")):
+            response = self.client.post(
+                "/api/simulate", json={**FIXED_PLAN, "usage_kwh": 1000, "scenarios": 10, field: value}
+            )
+
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("error", response.get_json())
+
+    def test_non_object_body_is_rejected(self):
+        response = self.client.post("/api/simulate", json=[1])
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_broken_pool_is_replaced(self):
+        broken = mock.Mock(spec=ProcessPoolExecutor)
+        broken.submit.side_effect = BrokenProcessPool("worker died")
+        with mock.patch.object(app_module, "_simulation_executor", broken), mock.patch.object(
+            app_module, "running_under_gevent", return_value=True
+        ):
+            response = self.client.post(
+                "/api/simulate", json={**FIXED_PLAN, "usage_kwh": 1000, "scenarios": 10}
+            )
+            replacement = app_module._simulation_executor
+
+        self.addCleanup(replacement.shutdown)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["scenarios"], 10)
+        self.assertIsNot(replacement, broken)
+        broken.shutdown.assert_called_once()
+
+
+class CalculateStreamTests(AppTestCase):
+    def test_streams_ndjson_rows(self):
+        response = self.client.post(
+            "/api/calculate/stream",
+            json={"plans": [FIXED_PLAN], "usages": [500, 1000]},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        self.assertEqual(response.headers["X-Accel-Buffering"], "no")
+        rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual(
+            rows,
+            [
+                {"plan_id": "fixed", "usage_kwh": 500.0, "bill_amount": 85.0, "true_rate_cents": 17.0},
+                {"plan_id": "fixed", "usage_kwh": 1000.0, "bill_amount": 160.0, "true_rate_cents": 16.0},
+            ],
+        )
+
+    def test_invalid_job_returns_json_error_before_streaming(self):
+        for body in (
+            {"plans": [FIXED_PLAN], "usages": [0]},
+            {"plans": [FIXED_PLAN], "usages": ["nan", "inf"]},
+            {"plans": [FIXED_PLAN], "usages": [1e308]},
+            {"plans": [{**FIXED_PLAN, "energy_rate_cents": "nan"}], "usages": [1000]},
+            [1],
+            {"plans": [FIXED_PLAN], "usages": [1], "mode": "x"},
+        ):
+            response = self.client.post("/api/calculate/stream", json=body)
+
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("error", response.get_json())
+
+
+class WhatIfEndpointTests(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.patch_module("whatif_sessions", WhatIfSessionStore())
+
+    def assert_session_flow(self):
+        started = self.client.post("/api/whatif", json={**FIXED_PLAN, "usage_kwh": 500})
+        self.assertEqual(started.status_code, 200)
+        self.assertEqual(started.get_json()["bill_amount"], 85.0)
+        session_id = started.get_json()["session_id"]
+
+        updated = self.client.patch(f"/api/whatif/{session_id}", json={"usage_kwh": 1000})
+        self.assertEqual(updated.status_code, 200)
+        self.assertEqual(updated.get_json()["bill_amount"], 160.0)
+
+        again = self.client.patch(f"/api/whatif/{session_id}", json={"base_charge": 0})
+        self.assertEqual(again.get_json()["bill_amount"], 150.0)
+
+        missing = self.client.patch("/api/whatif/unknown", json={"usage_kwh": 1000})
+        self.assertEqual(missing.status_code, 404)
+        self.assertTrue(missing.get_json()["expired"])
+
+    def test_start_update_and_unknown_session(self):
+        self.assert_session_flow()
+
+    def test_non_object_bodies_are_rejected(self):
+        started = self.client.post("/api/whatif", json=[1])
+        self.assertEqual(started.status_code, 400)
+        self.assertEqual(started.get_json()["error"], "Invalid or missing input data")
+
+        session_id = self.client.post("/api/whatif", json={**FIXED_PLAN, "usage_kwh": 500}).get_json()["session_id"]
+        updated = self.client.patch(f"/api/whatif/{session_id}", json=[1])
+        self.assertEqual(updated.status_code, 400)
+        self.assertEqual(updated.get_json()["error"], "Invalid or missing input data")
+
+    def test_non_finite_change_is_rejected_and_not_saved(self):
+        session_id = self.client.post("/api/whatif", json={**FIXED_PLAN, "usage_kwh": 500}).get_json()["session_id"]
+
+        updated = self.client.patch(f"/api/whatif/{session_id}", json={"usage_kwh": "nan"})
+        self.assertEqual(updated.status_code, 400)
+
+        again = self.client.patch(f"/api/whatif/{session_id}", json={"base_charge": 0})
+        self.assertEqual(again.get_json()["bill_amount"], 75.0)
+
+    def test_sqlite_sessions(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with mock.patch.object(
+                app_module, "whatif_sessions", SQLiteWhatIfSessionStore(os.path.join(directory, "whatif.sqlite3"))
+            ):
+                self.assert_session_flow()
+
+
+if __name__ == "__main__":
+    unittest.main()
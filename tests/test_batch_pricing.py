@@ -0,0 +1,78 @@
+import unittest
+
+from batch_pricing import MAX_ROWS, parse_batch, price_grid, rank_by_usage
+
+FIXED_PLAN = {
+    "id": "fixed",
+    "plan_type": "fixed_rate",
+    "base_charge": 10,
+    "base_delivery_charge": 0,
+    "energy_rate_cents": 10,
+    "tdu_rate_cents": 5,
+}
+
+CREDIT_PLAN = {
+    "id": "credit",
+    "plan_type": "fixed_rate_credit",
+    "base_charge": 0,
+    "base_delivery_charge": 0,
+    "energy_rate_cents": 12,
+    "tdu_rate_cents": 5,
+    "usage_credit": 50,
+    "credit_threshold_kwh": 1000,
+}
+
+
+class BatchPricingTests(unittest.TestCase):
+    def test_price_grid_yields_plan_by_usage_rows(self):
+        plans, usages = parse_batch({"plans": [FIXED_PLAN, CREDIT_PLAN], "usages": [500, 1000]})
+
+        rows = list(price_grid(plans, usages))
+
+        self.assertEqual(
+            [(row["plan_id"], row["usage_kwh"], row["bill_amount"]) for row in rows],
+            [("fixed", 500, 85), ("fixed", 1000, 160), ("credit", 500, 85), ("credit", 1000, 120)],
+        )
+        self.assertEqual(rows[1]["true_rate_cents"], 16)
+
+    def test_price_grid_is_lazy(self):
+        plans, usages = parse_batch({"plans": [FIXED_PLAN], "usages": list(range(1, 1000))})
+
+        rows = price_grid(plans, usages)
+
+        self.assertEqual(next(rows)["usage_kwh"], 1)
+
+    def test_rank_by_usage_orders_cheapest_first(self):
+        plans, usages = parse_batch({"plans": [FIXED_PLAN, CREDIT_PLAN], "usages": [999, 1000]})
+
+        rows = list(rank_by_usage(plans, usages))
+
+        self.assertEqual([entry["plan_id"] for entry in rows[0]["ranking"]], ["fixed", "credit"])
+        self.assertEqual([entry["plan_id"] for entry in rows[1]["ranking"]], ["credit", "fixed"])
+
+    def test_parse_batch_rejects_invalid_jobs(self):
+        for data in (
+            {"plans": [], "usages": [1000]},
+            {"plans": [FIXED_PLAN], "usages": [0]},
+            {"plans": [FIXED_PLAN], "usages": ["abc"]},
+            {"plans": [{"plan_type": "fixed_rate"}], "usages": [1000]},
+            {"plans": [FIXED_PLAN], "usages": ["nan"]},
+            {"plans": [FIXED_PLAN], "usages": ["inf"]},
+            {"plans": [{**FIXED_PLAN, "tdu_rate_cents": "inf"}], "usages": [1000]},
+        ):
+            with self.assertRaises(ValueError):
+                parse_batch(data)
+
+    def test_parse_batch_caps_total_rows(self):
+        usages = list(range(1, 1001))
+        plans_at_cap = [FIXED_PLAN] * (MAX_ROWS // len(usages))
+
+        plans, _ = parse_batch({"plans": plans_at_cap, "usages": usages})
+        self.assertEqual(len(plans) * len(usages), MAX_ROWS)
+
+        with self.assertRaises(ValueError):
+            parse_batch({"plans": plans_at_cap + [FIXED_PLAN], "usages": usages})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+from bill_risk import parse_plan, simulate_bill_risk
+
+CREDIT_PLAN = {
+    "usage_kwh": 1000,
+    "base_charge": 0,
+    "base_delivery_charge": 0,
+    "energy_rate_cents": 10,
+    "tdu_rate_cents": 5,
+    "usage_credit": 50,
+    "credit_threshold_kwh": 1000,
+}
+
+
+class BillRiskSimulationTests(unittest.TestCase):
+    def test_no_spread_matches_single_calculation(self):
+        plan = parse_plan("fixed_rate", CREDIT_PLAN)
+
+        result = simulate_bill_risk(plan, scenarios=100, usage_stddev_pct=0)
+
+        self.assertAlmostEqual(result.mean_bill, 150)
+        self.assertAlmostEqual(result.p10_bill, 150)
+        self.assertAlmostEqual(result.p90_bill, 150)
+        self.assertIsNone(result.threshold_kwh)
+        self.assertIsNone(result.probability_below_threshold)
+
+    def test_credit_threshold_at_estimate_is_missed_about_half_the_time(self):
+        plan = parse_plan("fixed_rate_credit", CREDIT_PLAN)
+
+        result = simulate_bill_risk(plan, scenarios=10_000, usage_stddev_pct=10, seed=7)
+
+        self.assertEqual(result.threshold_kwh, 1000)
+        self.assertAlmostEqual(result.probability_below_threshold, 0.5, delta=0.03)
+        self.assertLess(result.p10_bill, result.p50_bill)
+        self.assertLess(result.p50_bill, result.p90_bill)
+
+    def test_tiered_flat_fee_threshold(self):
+        plan = parse_plan(
+            "tiered",
+            {
+                "usage_kwh": 1200,
+                "base_charge": 0,
+                "base_delivery_charge": 0,
+                "tdu_rate_cents": 5,
+                "tier1_limit": 1000,
+                "tier2_limit": 2000,
+                "tier1_rate_cents": 12,
+                "tier1_flat_fee": 65,
+                "tier2_flat_fee": 0,
+            },
+        )
+
+        result = simulate_bill_risk(plan, scenarios=5_000, usage_stddev_pct=15, seed=3)
+
+        self.assertEqual(result.threshold_kwh, 1000)
+        self.assertGreater(result.probability_below_threshold, 0.05)
+        self.assertLess(result.probability_below_threshold, 0.2)
+
+    def test_results_are_identical_inline_and_across_process_pool(self):
+        plan = parse_plan("fixed_rate_credit", CREDIT_PLAN)
+
+        inline = simulate_bill_risk(plan, scenarios=12_000, seed=11)
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            pooled = simulate_bill_risk(plan, scenarios=12_000, seed=11, executor=executor, pool_threshold=0)
+
+        self.assertEqual(inline, pooled)
+
+    def test_rejects_invalid_settings(self):
+        plan = parse_plan("fixed_rate", CREDIT_PLAN)
+
+        with self.assertRaises(ValueError):
+            simulate_bill_risk(plan, scenarios=0)
+        for usage_stddev_pct in (-1, float("nan"), float("inf"), 101):
+            with self.assertRaises(ValueError):
+                simulate_bill_risk(plan, usage_stddev_pct=usage_stddev_pct)
+        with self.assertRaises(ValueError):
+            parse_plan("variable", CREDIT_PLAN)
+
+    def test_parse_plan_rejects_non_finite_values(self):
+        for field, value in (
+            ("usage_kwh", "nan"),
+            ("usage_kwh", "inf"),
+            ("energy_rate_cents", "nan"),
+            ("usage_credit", "inf"),
+            ("base_charge", "1e308"),
+        ):
+            with self.subTest(field=field, value=value), self.assertRaises(ValueError):
+                parse_plan("fixed_rate_credit", {**CREDIT_PLAN, field: value})
+        with self.assertRaises(ValueError):
+            parse_plan("tiered", {**CREDIT_PLAN, "tier1_limit": 500, "tier1_rate_cents": "nan"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+from click_rollups import ClickRollupStore, normalize_dimensions
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+class ClickRollupStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = ClickRollupStore(os.path.join(self.directory.name, "clicks.sqlite3"))
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+    def test_clicks_per_tdu_per_day(self):
+        self.store.record({"event": "compare_click", "source": "calculator", "tdu": "oncor"}, utc(2026, 3, 1, 9))
+        self.store.record({"event": "compare_click", "source": "guide", "tdu": "oncor"}, utc(2026, 3, 1, 17))
+        self.store.record({"event": "compare_click", "source": "calculator", "tdu": "centerpoint"}, utc(2026, 3, 1, 18))
+        self.store.record({"event": "compare_click", "source": "calculator", "tdu": "oncor"}, utc(2026, 3, 2, 1))
+
+        rows = self.store.clicks(granularity="day", group_by=["tdu"])
+
+        self.assertEqual(
+            [(row["bucket_start"], row["tdu"], row["clicks"]) for row in rows],
+            [
+                (utc(2026, 3, 1), "centerpoint", 1),
+                (utc(2026, 3, 1), "oncor", 2),
+                (utc(2026, 3, 2), "oncor", 1),
+            ],
+        )
+
+    def test_hourly_rollup_with_range_and_filter(self):
+        self.store.record_many(
+            [
+                ({"source": "calculator", "plan_type": "fixed_rate", "zip_code": "77002"}, utc(2026, 3, 1, 9, 5)),
+                ({"source": "calculator", "plan_type": "fixed_rate", "zip_code": "77002"}, utc(2026, 3, 1, 9, 55)),
+                ({"source": "calculator", "plan_type": "fixed_rate_credit"}, utc(2026, 3, 1, 10, 15)),
+                ({"source": "guide", "plan_type": "fixed_rate"}, utc(2026, 3, 1, 11, 0)),
+            ]
+        )
+
+        rows = self.store.clicks(
+            granularity="hour",
+            group_by=["plan_type", "zip_code"],
+            start=utc(2026, 3, 1, 9),
+            end=utc(2026, 3, 1, 11),
+            filters={"source": "calculator"},
+        )
+
+        self.assertEqual(
+            [(row["bucket_start"].hour, row["plan_type"], row["zip_code"], row["clicks"]) for row in rows],
+            [(9, "fixed_rate", "77002", 2), (10, "fixed_rate_credit", None, 1)],
+        )
+
+    def test_query_string_values_are_bounded(self):
+        self.assertEqual(
+            normalize_dimensions(
+                {"source": " Guide ", "tdu": "AEP Texas North", "plan_type": "tiered", "zip_code": "77002-1234"}
+            ),
+            ("guide", "aep_north", "tiered", "77002"),
+        )
+        self.assertEqual(
+            normalize_dimensions(
+                {"source": "x" * 33, "tdu": "evil", "plan_type": "<script>", "zip_code": "7700"}
+            ),
+            ("other", "other", "other", "other"),
+        )
+        self.assertEqual(normalize_dimensions({}), ("", "", "", ""))
+
+        for index in range(50):
+            self.store.record({"source": f"spam-{index}-" + "x" * 40, "zip_code": f"zip{index}"}, utc(2026, 3, 1, 9))
+        rows = self.store.clicks(granularity="day", group_by=["source", "zip_code"])
+        self.assertEqual([(row["source"], row["zip_code"], row["clicks"]) for row in rows], [("other", "other", 50)])
+
+    def test_days_follow_configured_timezone(self):
+        central = ZoneInfo("America/Chicago")
+        store = ClickRollupStore(os.path.join(self.directory.name, "central.sqlite3"), tz=central)
+        self.addCleanup(store.close)
+        # 03:00 UTC on March 2 is still the evening of March 1 in Texas.
+        store.record({"tdu": "oncor"}, utc(2026, 3, 1, 20))
+        store.record({"tdu": "oncor"}, utc(2026, 3, 2, 3))
+        store.record({"tdu": "oncor"}, utc(2026, 3, 2, 7))
+
+        rows = store.clicks(granularity="day", group_by=["tdu"])
+
+        self.assertEqual(
+            [(row["bucket_start"], row["clicks"]) for row in rows],
+            [(datetime(2026, 3, 1, tzinfo=central), 2), (datetime(2026, 3, 2, tzinfo=central), 1)],
+        )
+
+    def test_connection_is_reopened_after_fork(self):
+        self.store.record({"tdu": "oncor"}, utc(2026, 3, 1, 9))
+        parent_connection = self.store._connection
+
+        with mock.patch("click_rollups.os.getpid", return_value=os.getpid() + 1):
+            self.store.record({"tdu": "oncor"}, utc(2026, 3, 1, 10))
+            self.assertIsNot(self.store._connection, parent_connection)
+
+        parent_connection.close()
+        rows = self.store.clicks(granularity="day", group_by=["tdu"])
+        self.assertEqual([row["clicks"] for row in rows], [2])
+
+    def test_rejects_unknown_dimensions(self):
+        with self.assertRaises(ValueError):
+            self.store.clicks(group_by=["user_agent"])
+        with self.assertRaises(ValueError):
+            self.store.clicks(granularity="week")
+
+
+if __name__ == "__main__":
+    unittest.main()
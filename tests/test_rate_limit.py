@@ -0,0 +1,133 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from rate_limit import MemoryBucketStore, RateLimit, SQLiteBucketStore
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class RateLimitParseTests(unittest.TestCase):
+    def test_parse_requests_per_period(self):
+        limit = RateLimit.parse("10/60")
+
+        self.assertEqual(limit, RateLimit(capacity=10, period_seconds=60))
+        self.assertAlmostEqual(limit.refill_per_second, 1 / 6)
+
+    def test_parse_rejects_invalid_values(self):
+        for value in ("10", "ten/60", "0/60", "10/0"):
+            with self.assertRaises(ValueError):
+                RateLimit.parse(value)
+
+
+class MemoryBucketStoreTests(unittest.TestCase):
+    def test_allows_burst_then_reports_retry_after(self):
+        clock = FakeClock()
+        store = MemoryBucketStore(clock=clock)
+        limit = RateLimit(capacity=3, period_seconds=60)
+
+        self.assertEqual([store.hit("ip:1", limit) for _ in range(3)], [0.0, 0.0, 0.0])
+        self.assertAlmostEqual(store.hit("ip:1", limit), 20.0)
+        self.assertEqual(store.hit("ip:2", limit), 0.0)
+
+        clock.now += 20
+        self.assertEqual(store.hit("ip:1", limit), 0.0)
+        self.assertGreater(store.hit("ip:1", limit), 0.0)
+
+    def test_refilled_buckets_are_swept(self):
+        clock = FakeClock()
+        store = MemoryBucketStore(sweep_interval=30, clock=clock)
+        limit = RateLimit(capacity=2, period_seconds=10)
+
+        store.hit("ip:1", limit)
+        store.hit("ip:2", limit)
+        self.assertEqual(len(store), 2)
+
+        clock.now += 31
+        store.hit("ip:3", limit)
+        self.assertEqual(len(store), 1)
+
+    def test_sweep_passes_live_buckets_to_reach_expired_ones(self):
+        clock = FakeClock()
+        store = MemoryBucketStore(sweep_interval=30, clock=clock)
+        short = RateLimit(capacity=2, period_seconds=10)
+        long = RateLimit(capacity=2, period_seconds=3600)
+
+        store.hit("ip:live", long)
+        store.hit("ip:idle", short)
+        clock.now += 31
+        store.hit("ip:new", short)
+
+        self.assertEqual(len(store), 2)
+        self.assertEqual(store.hit("ip:live", long), 0.0)
+        self.assertGreater(store.hit("ip:live", long), 0.0)
+
+    def test_max_entries_bounds_memory(self):
+        store = MemoryBucketStore(max_entries=2, clock=FakeClock())
+        limit = RateLimit(capacity=1, period_seconds=3600)
+
+        for index in range(5):
+            store.hit(f"ip:{index}", limit)
+
+        self.assertLessEqual(len(store), 2)
+
+    def test_flood_of_new_keys_keeps_active_throttle(self):
+        clock = FakeClock()
+        store = MemoryBucketStore(max_entries=100, clock=clock)
+        limit = RateLimit(capacity=1, period_seconds=3600)
+
+        store.hit("ip:abuser", limit)
+        for index in range(1000):
+            store.hit(f"ip:new-{index}", limit)
+            if index % 50 == 0:
+                self.assertGreater(store.hit("ip:abuser", limit), 0.0)
+
+        self.assertLessEqual(len(store), 100)
+        self.assertGreater(store.hit("ip:abuser", limit), 0.0)
+
+
+class SQLiteBucketStoreTests(unittest.TestCase):
+    def test_buckets_are_shared_between_store_instances(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "limits.sqlite3")
+            clock = FakeClock()
+            first = SQLiteBucketStore(path, clock=clock)
+            second = SQLiteBucketStore(path, clock=clock)
+            limit = RateLimit(capacity=2, period_seconds=60)
+
+            self.assertEqual(first.hit("email:a@example.com", limit), 0.0)
+            self.assertEqual(second.hit("email:a@example.com", limit), 0.0)
+            self.assertAlmostEqual(first.hit("email:a@example.com", limit), 30.0)
+
+            clock.now += 30
+            self.assertEqual(second.hit("email:a@example.com", limit), 0.0)
+
+    def test_threads_share_one_connection(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = SQLiteBucketStore(os.path.join(directory, "limits.sqlite3"), clock=FakeClock())
+            limit = RateLimit(capacity=100, period_seconds=60)
+            connections = set()
+
+            def hit() -> None:
+                store.hit("ip:1", limit)
+                connections.add(id(store._connection))
+
+            threads = [threading.Thread(target=hit) for _ in range(10)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            self.assertEqual(len(connections), 1)
+            self.assertAlmostEqual(store.hit("ip:1", limit), 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
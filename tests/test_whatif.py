@@ -0,0 +1,175 @@
+import dataclasses
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+from fixed_rate_plan import PlanInputWithCredit
+from tiered_plan import TieredPlanInput, calculateTieredPlan
+from whatif import SQLiteWhatIfSessionStore, WhatIfPlan, WhatIfSessionStore
+
+CREDIT_PLAN = {
+    "plan_type": "fixed_rate_credit",
+    "usage_kwh": 900,
+    "base_charge": 4.95,
+    "base_delivery_charge": 4.9,
+    "energy_rate_cents": 7.21,
+    "tdu_rate_cents": 5.9,
+    "usage_credit": 50,
+    "credit_threshold_kwh": 1000,
+}
+
+TIERED_PLAN = {
+    "plan_type": "tiered",
+    "usage_kwh": 900,
+    "base_charge": 0,
+    "base_delivery_charge": 0,
+    "tdu_rate_cents": 5,
+    "tier1_limit": 1000,
+    "tier2_limit": 2000,
+    "tier1_rate_cents": 12,
+    "tier2_rate_cents": 12,
+    "tier3_rate_cents": 12,
+    "tier1_flat_fee": 65,
+    "tier2_flat_fee": 75,
+}
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class WhatIfPlanTests(unittest.TestCase):
+    def test_deltas_match_full_recalculation(self):
+        plan = WhatIfPlan.from_json(CREDIT_PLAN)
+        current = dict(CREDIT_PLAN)
+
+        for changes in (
+            {"usage_kwh": 1000},
+            {"energy_rate_cents": "9.5"},
+            {"base_charge": 0, "usage_credit": 100},
+            {"usage_kwh": 999.5},
+        ):
+            plan.apply(changes)
+            current.update(changes)
+            expected = PlanInputWithCredit.from_json(current)
+            self.assertAlmostEqual(plan.calculate_bill_amount(), expected.calculate_bill_amount())
+
+    def test_tiered_deltas_match_full_recalculation(self):
+        plan = WhatIfPlan.from_json(TIERED_PLAN)
+
+        plan.apply({"usage_kwh": 1200, "tier2_flat_fee": ""})
+
+        expected = calculateTieredPlan(
+            TieredPlanInput.from_json({**TIERED_PLAN, "usage_kwh": 1200, "tier2_flat_fee": None})
+        )
+        self.assertAlmostEqual(plan.calculate_bill_amount(), expected.totalCost)
+        self.assertEqual(plan.result()["bill_amount_display"], f"{expected.totalCost:.2f}")
+
+    def test_invalid_delta_leaves_plan_unchanged(self):
+        plan = WhatIfPlan.from_json(CREDIT_PLAN)
+        before = plan.result()
+
+        for changes in (
+            {"usage_kwh": 0},
+            {"usage_credit": -1},
+            {"energy_rate_cents": "abc"},
+            {"tier1_limit": 100},
+            {"plan_type": "fixed_rate"},
+            {"base_charge": 1, "usage_kwh": -5},
+            {"usage_kwh": "nan"},
+            {"energy_rate_cents": "inf"},
+            {"usage_credit": "1e308"},
+            [("usage_kwh", 1000)],
+        ):
+            with self.assertRaises(ValueError):
+                plan.apply(changes)
+
+        self.assertEqual(plan.result(), before)
+
+    def test_concurrent_changes_keep_cached_terms_in_step(self):
+        plan = WhatIfPlan.from_json(CREDIT_PLAN)
+        # Switch threads often so unlocked updates would interleave.
+        self.addCleanup(sys.setswitchinterval, sys.getswitchinterval())
+        sys.setswitchinterval(1e-6)
+
+        def change(field, values):
+            for value in values:
+                plan.apply({field: value})
+
+        threads = [
+            threading.Thread(target=change, args=("energy_rate_cents", [8 + index % 5 for index in range(2000)])),
+            threading.Thread(target=change, args=("usage_kwh", [900 + index % 300 for index in range(2000)])),
+            threading.Thread(target=change, args=("base_charge", [index % 7 for index in range(2000)])),
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        expected = PlanInputWithCredit.from_json({**CREDIT_PLAN, **dataclasses.asdict(plan.plan)})
+        self.assertAlmostEqual(plan.calculate_bill_amount(), expected.calculate_bill_amount())
+
+    def test_tier_limit_order_is_validated(self):
+        plan = WhatIfPlan.from_json(TIERED_PLAN)
+
+        with self.assertRaises(ValueError):
+            plan.apply({"tier2_limit": 500})
+
+
+class WhatIfSessionStoreTests(unittest.TestCase):
+    def test_sessions_expire_after_idle_ttl(self):
+        clock = FakeClock()
+        store = WhatIfSessionStore(ttl_seconds=60, clock=clock)
+        plan = WhatIfPlan.from_json(CREDIT_PLAN)
+        session_id = store.create(plan)
+
+        clock.now += 59
+        self.assertIs(store.get(session_id), plan)
+        clock.now += 59
+        self.assertIs(store.get(session_id), plan)
+        clock.now += 61
+        self.assertIsNone(store.get(session_id))
+        self.assertEqual(len(store), 0)
+
+    def test_oldest_sessions_are_evicted_at_capacity(self):
+        store = WhatIfSessionStore(max_sessions=2, clock=FakeClock())
+        plan = WhatIfPlan.from_json(CREDIT_PLAN)
+
+        first = store.create(plan)
+        store.create(plan)
+        store.create(plan)
+
+        self.assertIsNone(store.get(first))
+        self.assertEqual(len(store), 2)
+
+
+class SQLiteWhatIfSessionStoreTests(unittest.TestCase):
+    def test_sessions_are_shared_between_store_instances(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "whatif.sqlite3")
+            clock = FakeClock()
+            first = SQLiteWhatIfSessionStore(path, ttl_seconds=60, clock=clock)
+            second = SQLiteWhatIfSessionStore(path, ttl_seconds=60, clock=clock)
+            session_id = first.create(WhatIfPlan.from_json(TIERED_PLAN))
+
+            plan = second.get(session_id)
+            plan.apply({"usage_kwh": 1200})
+            second.save(session_id, plan)
+
+            reloaded = first.get(session_id)
+            self.assertEqual(reloaded.plan_type, "tiered")
+            self.assertEqual(reloaded.result(), plan.result())
+
+            clock.now += 61
+            self.assertIsNone(first.get(session_id))
+            self.assertIsNone(first.get("unknown"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,321 @@
+from __future__ import annotations
+
+import dataclasses
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from bill_risk import check_plan_value, parse_plan
+from fixed_rate_plan import PlanInput, PlanInputWithCredit
+from tiered_plan import TieredPlanInput, calculateTieredPlan
+
+# Request field -> (dataclass attribute, optional) for each plan type.
+_FIXED_RATE_FIELDS: Dict[str, Tuple[str, bool]] = {
+    "base_charge": ("base_charge", False),
+    "energy_rate_cents": ("energy_rate_cents", False),
+    "tdu_rate_cents": ("tdu_rate_cents", False),
+    "base_delivery_charge": ("base_delivery_charge", False),
+    "usage_kwh": ("usage_kwh", False),
+}
+_CREDIT_FIELDS: Dict[str, Tuple[str, bool]] = {
+    **_FIXED_RATE_FIELDS,
+    "usage_credit": ("usage_credit", False),
+    "credit_threshold_kwh": ("credit_threshold_kwh", False),
+}
+_TIERED_FIELDS: Dict[str, Tuple[str, bool]] = {
+    "usage_kwh": ("usage_kwh", False),
+    "base_charge": ("base_charge", False),
+    "base_delivery_charge": ("delivery_base_fee", False),
+    "tdu_rate_cents": ("tdu_rate_cents", False),
+    "tier1_limit": ("tier1_limit", True),
+    "tier2_limit": ("tier2_limit", True),
+    "tier1_rate_cents": ("tier1_rate_cents", True),
+    "tier2_rate_cents": ("tier2_rate_cents", True),
+    "tier3_rate_cents": ("tier3_rate_cents", True),
+    "tier1_flat_fee": ("tier1_flat_fee", True),
+    "tier2_flat_fee": ("tier2_flat_fee", True),
+}
+_FIELDS_BY_PLAN_TYPE = {
+    "fixed_rate": _FIXED_RATE_FIELDS,
+    "fixed_rate_credit": _CREDIT_FIELDS,
+    "tiered": _TIERED_FIELDS,
+}
+_PLAN_CLASSES = {
+    "fixed_rate": PlanInput,
+    "fixed_rate_credit": PlanInputWithCredit,
+    "tiered": TieredPlanInput,
+}
+
+
+def _parse_change(value: Any, optional: bool) -> Optional[float]:
+    if optional and (value is None or value == ""):
+        return None
+    try:
+        parsed = float(value)
+    except (TypeError, ValueError) as exc:
+        raise ValueError("Invalid or missing input data") from exc
+    return check_plan_value(parsed)
+
+
+class WhatIfPlan:
+    """A validated plan that re-prices itself from field-level changes.
+
+    Fixed-rate plans keep their fixed charge and per-kWh rate precomputed, so a
+    ``usage_kwh`` change is one multiply and an add; rate or fee changes refresh
+    only the term they feed. Tiered plans skip re-parsing and re-run the tier math.
+    The in-memory store hands the same object to concurrent requests, so changes and
+    reads of the plan and its cached terms happen under a per-plan lock.
+    """
+
+    def __init__(self, plan_type: str, plan: Any) -> None:
+        self.plan_type = plan_type
+        self.plan = plan
+        self._lock = threading.Lock()
+        self._fields = _FIELDS_BY_PLAN_TYPE[plan_type]
+        self._fixed_charge = 0.0
+        self._energy_rate_dollars = 0.0
+        if isinstance(plan, PlanInput):
+            self._fixed_charge = plan.fixed_charge_dollars()
+            self._energy_rate_dollars = (plan.energy_rate_cents + plan.tdu_rate_cents) / 100
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "WhatIfPlan":
+        if not isinstance(data, dict):
+            raise ValueError("Invalid or missing input data")
+
+        plan_type = data.get("plan_type", "fixed_rate")
+        if plan_type not in _FIELDS_BY_PLAN_TYPE:
+            raise ValueError("Unsupported plan type")
+        return cls(plan_type, parse_plan(plan_type, data))
+
+    def to_state(self) -> str:
+        with self._lock:
+            fields = dataclasses.asdict(self.plan)
+        return json.dumps({"plan_type": self.plan_type, "fields": fields})
+
+    @classmethod
+    def from_state(cls, state: str) -> "WhatIfPlan":
+        # The stored fields were validated when the session was created or last changed.
+        data = json.loads(state)
+        plan_type = data["plan_type"]
+        return cls(plan_type, _PLAN_CLASSES[plan_type](**data["fields"]))
+
+    def apply(self, changes: Dict[str, Any]) -> None:
+        """Validate and apply only the changed fields; nothing changes if any is invalid."""
+        if not isinstance(changes, dict):
+            raise ValueError("Invalid or missing input data")
+
+        if "plan_type" in changes and changes["plan_type"] != self.plan_type:
+            raise ValueError("Start a new what-if session to change plan type")
+
+        updates: Dict[str, Optional[float]] = {}
+        for key, value in changes.items():
+            if key == "plan_type":
+                continue
+            field = self._fields.get(key)
+            if field is None:
+                raise ValueError(f"Unsupported field: {key}")
+            attribute, optional = field
+            updates[attribute] = _parse_change(value, optional)
+
+        if not updates:
+            return
+
+        with self._lock:
+            plan = dataclasses.replace(self.plan, **updates)
+            self._validate(plan, updates)
+            self.plan = plan
+
+            if isinstance(plan, PlanInput):
+                if "base_charge" in updates or "base_delivery_charge" in updates:
+                    self._fixed_charge = plan.fixed_charge_dollars()
+                if "energy_rate_cents" in updates or "tdu_rate_cents" in updates:
+                    self._energy_rate_dollars = (plan.energy_rate_cents + plan.tdu_rate_cents) / 100
+
+    @staticmethod
+    def _validate(plan: Any, updates: Dict[str, Optional[float]]) -> None:
+        # Mirrors the from_json checks, restricted to the fields that changed.
+        if "usage_kwh" in updates and plan.usage_kwh <= 0:
+            raise ValueError("Usage must be greater than zero")
+
+        if isinstance(plan, PlanInputWithCredit):
+            if "usage_credit" in updates and plan.usage_credit < 0:
+                raise ValueError("Usage credit cannot be negative")
+            if "credit_threshold_kwh" in updates and plan.credit_threshold_kwh < 0:
+                raise ValueError("Usage threshold cannot be negative")
+
+        if isinstance(plan, TieredPlanInput) and ("tier1_limit" in updates or "tier2_limit" in updates):
+            if plan.tier1_limit is not None and plan.tier1_limit < 0:
+                raise ValueError("Tier 1 limit cannot be negative")
+            if plan.tier2_limit is not None:
+                if plan.tier2_limit < 0:
+                    raise ValueError("Tier 2 limit cannot be negative")
+                if plan.tier1_limit is not None and plan.tier2_limit < plan.tier1_limit:
+                    raise ValueError("Tier 2 limit must be greater than Tier 1 limit")
+
+    def calculate_bill_amount(self) -> float:
+        with self._lock:
+            return self._bill_amount()
+
+    def _bill_amount(self) -> float:
+        plan = self.plan
+        if isinstance(plan, TieredPlanInput):
+            return calculateTieredPlan(plan).totalCost
+
+        amount = self._energy_rate_dollars * plan.usage_kwh + self._fixed_charge
+        if isinstance(plan, PlanInputWithCredit):
+            if plan.usage_kwh >= plan.credit_threshold_kwh:
+                amount -= plan.usage_credit
+            amount = max(amount, 0.0)
+        return amount
+
+    def result(self) -> Dict[str, Any]:
+        with self._lock:
+            bill = self._bill_amount()
+            usage_kwh = self.plan.usage_kwh
+        true_rate_cents = round((bill / usage_kwh) * 100, 2)
+        bill_amount = round(bill, 2)
+        return {
+            "true_rate_cents": true_rate_cents,
+            "true_rate_display": f"{true_rate_cents:.2f}",
+            "bill_amount": bill_amount,
+            "bill_amount_display": f"{bill_amount:.2f}",
+        }
+
+
+class WhatIfSessionStore:
+    """Per-process what-if plans keyed by an opaque session id, expired after ``ttl_seconds`` idle."""
+
+    def __init__(
+        self,
+        ttl_seconds: float = 1800.0,
+        max_sessions: int = 10_000,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._sessions: "OrderedDict[str, Tuple[float, WhatIfPlan]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._ttl_seconds = ttl_seconds
+        self._max_sessions = max_sessions
+        self._clock = clock
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def create(self, plan: WhatIfPlan) -> str:
+        session_id = secrets.token_urlsafe(16)
+        now = self._clock()
+        with self._lock:
+            self._expire(now)
+            self._sessions[session_id] = (now, plan)
+            while len(self._sessions) > self._max_sessions:
+                self._sessions.popitem(last=False)
+        return session_id
+
+    def get(self, session_id: str) -> Optional[WhatIfPlan]:
+        now = self._clock()
+        with self._lock:
+            self._expire(now)
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            self._sessions[session_id] = (now, entry[1])
+            self._sessions.move_to_end(session_id)
+            return entry[1]
+
+    def save(self, session_id: str, plan: WhatIfPlan) -> None:
+        # Plans are held by reference, so changes applied to ``get``'s result are already stored.
+        return None
+
+    def _expire(self, now: float) -> None:
+        # Sessions are kept in last-used order, so expired ones sit at the front.
+        cutoff = now - self._ttl_seconds
+        while self._sessions:
+            session_id, (last_used, _) = next(iter(self._sessions.items()))
+            if last_used > cutoff:
+                break
+            del self._sessions[session_id]
+
+
+class SQLiteWhatIfSessionStore:
+    """What-if plans kept in a local SQLite file so every gunicorn worker can serve a session."""
+
+    def __init__(
+        self,
+        path: str,
+        ttl_seconds: float = 1800.0,
+        sweep_interval: float = 60.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self._path = path
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._connection_pid = 0
+        self._ttl_seconds = ttl_seconds
+        self._sweep_interval = sweep_interval
+        self._clock = clock
+        self._next_sweep = clock() + sweep_interval
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per process under ``self._lock``, reopened after a fork.
+        pid = os.getpid()
+        if self._connection is None or self._connection_pid != pid:
+            connection = sqlite3.connect(self._path, timeout=1.0, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                """
+                create table if not exists whatif_sessions (
+                  session_id text primary key,
+                  state text not null,
+                  last_used real not null
+                ) without rowid
+                """
+            )
+            connection.commit()
+            self._connection = connection
+            self._connection_pid = pid
+        return self._connection
+
+    def create(self, plan: WhatIfPlan) -> str:
+        session_id = secrets.token_urlsafe(16)
+        self.save(session_id, plan)
+        return session_id
+
+    def get(self, session_id: str) -> Optional[WhatIfPlan]:
+        now = self._clock()
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                if now >= self._next_sweep:
+                    self._next_sweep = now + self._sweep_interval
+                    connection.execute(
+                        "DELETE FROM whatif_sessions WHERE last_used <= ?", (now - self._ttl_seconds,)
+                    )
+                row = connection.execute(
+                    "SELECT state FROM whatif_sessions WHERE session_id = ? AND last_used > ?",
+                    (session_id, now - self._ttl_seconds),
+                ).fetchone()
+        if row is None:
+            return None
+        return WhatIfPlan.from_state(row[0])
+
+    def save(self, session_id: str, plan: WhatIfPlan) -> None:
+        now = self._clock()
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute(
+                    """
+                    INSERT INTO whatif_sessions (session_id, state, last_used)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT(session_id) DO UPDATE SET
+                      state = excluded.state,
+                      last_used = excluded.last_used
+                    """,
+                    (session_id, plan.to_state(), now),
+                )